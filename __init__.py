@@ -1,9 +1,9 @@
 from .save_image_extra_metadata import SaveImage_NoWorkflow
 from .image_scale_bounding_box import ImageScaleBoundingBox
 from .inpaint_model import MakeInpaintModel
-from .math_interpreter import Sympy_Interpreter
+from .math_interpreter import Sympy_Interpreter, Sympy_Interpreter_Batch
 from .clipboard_paste import PasteImage
-from .text_encode_wildcards import TextEncodeWildcards
+from .text_encode_wildcards import TextEncodeWildcards, TextEncodeWildcardsBatch
 from .get_workflow_data import GetWorkflowData, GetGenerationData
 
 # A dictionary that contains all nodes you want to export with their names
@@ -13,10 +13,12 @@ NODE_CLASS_MAPPINGS: dict[str, object] = {
     "Image Scale Bounding Box" : ImageScaleBoundingBox,
     "Make Inpaint Model": MakeInpaintModel,
     "Sympy Math Interpreter": Sympy_Interpreter,
+    "Sympy Math Interpreter Batch": Sympy_Interpreter_Batch,
     "Image Clipboard Paster": PasteImage,
     "Text Encode Wildcards": TextEncodeWildcards,
+    "Text Encode Wildcards Batch": TextEncodeWildcardsBatch,
     "Get Workflow Data": GetWorkflowData,
-    # "Get Generation Data": GetGenerationData,
+    "Get Generation Data": GetGenerationData,
 }
 
 
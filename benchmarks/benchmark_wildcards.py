@@ -0,0 +1,137 @@
+"""
+@author: AlexL
+@title: ComfyUI-Hangover-Wildcards benchmark
+@description: Measures the wildcard file index and the prompt expansion of the Text Encode Wildcards nodes
+on a synthetic wildcard tree. Runs without ComfyUI and without a clipboard:
+
+    python benchmarks/benchmark_wildcards.py --files 200 --lines 5000 --depth 3 --placeholders 20
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from wildcards import WildcardFileDict, compile_template # noqa: E402
+
+
+WORDS: list[str] = ["red", "blue", "green", "tall", "small", "old", "young", "cat", "dog", "tree", "house", "river",
+                    "portrait", "landscape", "sunset", "night", "rain", "forest", "city", "castle", "dragon", "knight"]
+
+
+def make_wildcard_tree(root: Path, num_files: int, num_lines: int, depth: int, nested: float, rng: random.Random) -> list[str]:
+    """Write num_files wildcard files with num_lines lines each, spread over a folder tree of the given depth.
+    A fraction 'nested' of the lines contains a {placeholder} of another file. Returns the file key words."""
+    folders: list[Path] = [root]
+    for level in range(depth):
+        folders += [folder / f"folder_{level}_{i}" for folder in folders if len(folder.parts) - len(root.parts) == level for i in range(2)]
+    key_words = [f"wildcard_{i}" for i in range(num_files)]
+
+    for i, key_word in enumerate(key_words):
+        folder = folders[i % len(folders)]
+        folder.mkdir(parents=True, exist_ok=True)
+        lines = ["# synthetic wildcard file"]
+        for _ in range(num_lines):
+            line = " ".join(rng.choices(WORDS, k=3))
+            if rng.random() < nested:
+                line += f" {{{rng.choice(key_words)}}}"
+            lines.append(line)
+        (folder / f"{key_word}.txt").write_text(data="\n".join(lines), encoding="utf-8")
+    return key_words
+
+
+def make_prompt(key_words: list[str], num_placeholders: int, rng: random.Random) -> str:
+    return ", ".join(f"{rng.choice(WORDS)} {{{rng.choice(key_words)}}}" for _ in range(num_placeholders))
+
+
+def measure(function: Callable[[], Any]) -> tuple[float, int, Any]:
+    """Run the function once, return the elapsed seconds, the peak of the traced memory and the result"""
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    return elapsed, tracemalloc.get_traced_memory()[1], result
+
+
+def run_benchmark(args: argparse.Namespace) -> dict[str, float]:
+    rng = random.Random(args.seed)
+    results: dict[str, float] = {}
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        root = Path(temp_folder) / "wildcards"
+        key_words = make_wildcard_tree(root=root, num_files=args.files, num_lines=args.lines, depth=args.depth, nested=args.nested, rng=rng)
+        prompts = [make_prompt(key_words=key_words, num_placeholders=args.placeholders, rng=rng) for _ in range(args.prompts)]
+
+        WildcardFileDict.CACHE_FOLDER = Path(temp_folder) / ".cache"
+        WildcardFileDict.VERBOSE = False
+        tracemalloc.start()
+
+        results["index_cold_s"], results["index_cold_peak_bytes"], _ = measure(lambda: WildcardFileDict(root_folders=[root], extensions=[".txt"]))
+        results["index_warm_s"], results["index_warm_peak_bytes"], wildcard_dict = measure(lambda: WildcardFileDict(root_folders=[root], extensions=[".txt"]))
+
+        compile_template.cache_clear()
+        results["expand_cold_s"], results["expand_cold_peak_bytes"], _ = measure(
+            lambda: [wildcard_dict.expand_template(segments=compile_template(prompt=prompt), recursive=True, seed=0) for prompt in prompts])
+
+        latencies: list[float] = []
+        tracemalloc.reset_peak()
+        for seed in range(args.repeat):
+            for prompt in prompts:
+                start = time.perf_counter()
+                wildcard_dict.expand_template(segments=compile_template(prompt=prompt), recursive=True, seed=seed)
+                latencies.append(time.perf_counter() - start)
+        results["expand_warm_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        results["expand_warm_mean_s"] = statistics.fmean(latencies)
+        results["expand_warm_median_s"] = statistics.median(latencies)
+        results["expand_warm_p95_s"] = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+
+        for workers in sorted({1, args.workers}):
+            elapsed, peak, _ = measure(lambda: wildcard_dict.expand_batch(prompt=prompts[0], recursive=True, seeds=range(args.batch_size), max_workers=workers))
+            results[f"batch_{workers}_workers_prompts_per_second"] = args.batch_size / elapsed
+            results[f"batch_{workers}_workers_peak_bytes"] = peak
+
+        tracemalloc.stop()
+    return results
+
+
+def print_results(results: dict[str, float]) -> None:
+    for name, value in results.items():
+        if name.endswith("_s"):
+            text = f"{value * 1000:12.3f} ms"
+        elif name.endswith("_bytes"):
+            text = f"{value / 1024 / 1024:12.3f} MB"
+        else:
+            text = f"{value:12.1f}"
+        print(f"{name:<40}{text}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the wildcard index and prompt expansion")
+    parser.add_argument("--files", type=int, default=200, help="number of wildcard files")
+    parser.add_argument("--lines", type=int, default=2000, help="lines per wildcard file")
+    parser.add_argument("--depth", type=int, default=3, help="depth of the wildcard folder tree")
+    parser.add_argument("--nested", type=float, default=0.05, help="fraction of lines that contain a nested {placeholder}")
+    parser.add_argument("--placeholders", type=int, default=20, help="placeholders per prompt")
+    parser.add_argument("--prompts", type=int, default=20, help="number of different prompts")
+    parser.add_argument("--repeat", type=int, default=10, help="warm expansions per prompt")
+    parser.add_argument("--batch-size", type=int, default=256, help="prompts per batch expansion")
+    parser.add_argument("--workers", type=int, default=8, help="threads for the parallel batch expansion")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic wildcard tree")
+    parser.add_argument("--json", action="store_true", help="print the results as json")
+    args = parser.parse_args()
+
+    results = run_benchmark(args=args)
+    if args.json:
+        print(json.dumps(obj=results, indent=2))
+    else:
+        print_results(results=results)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,9 @@
 """
 
 from torch import Tensor
-from PIL import Image
-import numpy as np
 from comfy.comfy_types.node_typing import IO, ComfyNodeABC, InputTypeDict
 from pyperclipimg import copy
+from .image_convert import to_pil_images
 
 
 class CopyImage(ComfyNodeABC):
@@ -29,6 +28,5 @@ class CopyImage(ComfyNodeABC):
     def copy(self, image: Tensor) -> tuple[Tensor]:
         if image.shape[0] > 1:
             print(f"Note: copy batched images to the clipboard is not supported, picking the first one")
-        img = np.clip(image[0].cpu().numpy() * 255., 0, 255).astype(np.uint8)
-        copy(image=Image.fromarray(obj=img))
+        copy(image=to_pil_images(images=image[:1])[0]) # only the first image is converted and transferred
         return image, 
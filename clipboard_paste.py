@@ -4,12 +4,13 @@
 @nickname: Clipboard_Paste
 @description: Automatic paste the image from the clipboard
 """
-from _hashlib import HASH
 from typing import Generator
+import io
+import os
+import zlib
 import torch
 import numpy as np
 from PIL import ImageGrab, Image, UnidentifiedImageError
-from hashlib import md5
 import pillow_avif # this adds avif support to Pillow
 from comfy.comfy_types.node_typing import IO, InputTypeDict, ComfyNodeABC
 
@@ -26,17 +27,50 @@ class PasteImage(ComfyNodeABC):
         if they have the same size and format.
         """
     
-    hash: HASH = md5()
+    fingerprint: str = ""
+    _clip: Image.Image | list[str] | None = None # grabbed by IS_CHANGED, used by the following paste
+
+
+    @classmethod
+    def GrabClipboard(cls) -> Image.Image | list[str] | None:
+        try:
+            return ImageGrab.grabclipboard()
+        except Exception:
+            return None
+
+
+    @classmethod
+    def Fingerprint(cls, clip: Image.Image | list[str] | None) -> str | None:
+        """A cheap fingerprint of the clipboard content, None if it has no image(s).
+        Images are identified by a crc32 of their pixels, files by their size and time."""
+        if isinstance(clip, list):
+            stats = []
+            for file in clip:
+                try:
+                    stat = os.stat(file)
+                    stats.append(f"{file}:{stat.st_size}:{stat.st_mtime_ns}")
+                except OSError:
+                    pass
+            return f"files:{zlib.crc32(chr(0).join(stats).encode()):08x}" if stats else None
+        if isinstance(clip, Image.Image):
+            if isinstance(fp := getattr(clip, "fp", None), io.BytesIO): # not decoded yet, the clipboard data is hashed
+                with fp.getbuffer() as data:
+                    return f"{clip.mode}:{clip.size}:{len(data)}:{zlib.crc32(data):08x}"
+            # grabclipboard() loads some formats right away, then every pixel is hashed, so any change is detected:
+            return f"{clip.mode}:{clip.size}:{zlib.crc32(clip.tobytes()):08x}"
+        return None
+
 
     @classmethod
     def GetPILImageFromClipboard(cls) -> Generator[Image.Image, None, None]:
-        """Get the image(s) from clipboard, convert and yield the image."""
+        """Get the image(s) from clipboard, convert and yield the image.
+        The clipboard grabbed by IS_CHANGED is used once, so the pasted image is the one that was fingerprinted."""
+
+        clip, cls._clip = cls._clip, None
+        if clip is None:
+            clip = cls.GrabClipboard()
 
         try:
-            clip: Image.Image | list[str] | None = ImageGrab.grabclipboard()
-            if clip is None:
-                return
-            
             if isinstance(clip, list):
                     for img in clip:
                         try:
@@ -44,7 +78,8 @@ class PasteImage(ComfyNodeABC):
                         except FileNotFoundError:
                             pass
             elif isinstance(clip, Image.Image):
-                yield Image.frombytes(mode=clip.mode, size=clip.size, data=clip.tobytes())
+                clip.load() # decoded in place, errors are handled like before
+                yield clip
         except:
             pass
         finally:
@@ -63,13 +98,12 @@ class PasteImage(ComfyNodeABC):
     @classmethod
     def IS_CHANGED(cls, alt_image: torch.Tensor | None = None) -> str:
         # nessesary for the change in the clipboard to be recognized by ConfyUI
-        changed = False
-        for img in cls.GetPILImageFromClipboard():
-            if not changed:
-                cls.hash = md5()
-            cls.hash.update(img.tobytes())
-            changed = True
-        return cls.hash.digest().hex()
+        clip = cls.GrabClipboard()
+        fingerprint = cls.Fingerprint(clip=clip)
+        cls._clip = clip if fingerprint is not None else None
+        if fingerprint is not None: # without image(s) in the clipboard the last one is still valid
+            cls.fingerprint = fingerprint
+        return cls.fingerprint
     
 
     def paste(self, alt_image: torch.Tensor | None = None, alt_mask: torch.Tensor | None = None) -> tuple[torch.Tensor, torch.Tensor]:
@@ -1,13 +1,92 @@
 from comfy.comfy_types.node_typing import IO, ComfyNodeABC, InputTypeDict
-from typing import Any
+from typing import Any, Callable, Iterator, NamedTuple
 import json
 import functools
 import torch
+from .prompt_graph import PromptGraph
+
+
+class CompiledPath(NamedTuple):
+    keys: tuple[str, ...]
+    steps: tuple[str | slice, ...] # keys, "*", "**" or slices of lists
+    is_query: bool # has wildcards or slices and matches a list of values
+
+
+@functools.lru_cache(maxsize=256)
+def compile_path(path: str) -> CompiledPath:
+    """Compile a 'dot.formatted.key' path. '*' matches any child, '**' any descendant and 'start:stop:step' a slice of a list"""
+    keys = tuple(path.split('.'))
+    steps: list[str | slice] = []
+    for key in keys:
+        if ':' in key:
+            try:
+                steps.append(slice(*(int(part) if part else None for part in key.split(':'))))
+            except (ValueError, TypeError):
+                raise ValueError(f"Invalid slice <{key}> in path <{path}>")
+        else:
+            steps.append(key)
+    return CompiledPath(keys=keys, steps=tuple(steps), is_query=any(isinstance(step, slice) or step in ("*", "**") for step in steps))
+
+
+def children(obj: Any) -> Iterator[Any]:
+    if isinstance(obj, dict):
+        yield from obj.values()
+    elif isinstance(obj, (list, tuple)):
+        yield from obj
+
+
+def match_path(obj: Any, steps: tuple[str | slice, ...]) -> Iterator[Any]:
+    """Yield all values matching the compiled path steps, in one pass over the data"""
+    if not steps:
+        yield obj
+        return
+    step, rest = steps[0], steps[1:]
+    if step == "**":
+        yield from match_path(obj, rest)
+        for child in children(obj):
+            yield from match_path(child, steps)
+    elif step == "*":
+        for child in children(obj):
+            yield from match_path(child, rest)
+    elif isinstance(obj, dict):
+        if not isinstance(step, slice) and step in obj:
+            yield from match_path(obj[step], rest)
+    elif isinstance(obj, (list, tuple)):
+        if isinstance(step, slice):
+            for item in obj[step]:
+                yield from match_path(item, rest)
+        elif step.lstrip('-').isdigit() and -len(obj) <= int(step) < len(obj):
+            yield from match_path(obj[int(step)], rest)
 
 
 class WorkFlowData(ComfyNodeABC):
+    VERBOSE = False # print the data of the connected node to the console
+
+    # values derived from the prompt that is being executed, shared by all nodes of the prompt:
+    _memo_prompt: dict | None = None
+    _memo: dict[Any, Any] = {}
+
+
+    @staticmethod
+    def memoize(prompt: dict, key: Any, function: Callable[[], Any]) -> Any:
+        """Compute the value only once per prompt, the memo is dropped when the next prompt is executed"""
+        if WorkFlowData._memo_prompt is not prompt:
+            WorkFlowData._memo_prompt = prompt
+            WorkFlowData._memo = {}
+        if key not in WorkFlowData._memo:
+            WorkFlowData._memo[key] = function()
+        return WorkFlowData._memo[key]
+
+
+    @classmethod
+    def prompt_graph(cls, prompt: dict) -> PromptGraph:
+        """The graph index of the prompt, built once per prompt"""
+        return cls.memoize(prompt=prompt, key="graph", function=lambda: PromptGraph(prompt=prompt))
+
+
     def get_nested_value(self, data, keys) -> Any:
-        """recursively dismantle the data object until the 'dot.formatet.key' is found, or en exception is trown if not"""
+        """recursively dismantle the data object until the 'dot.formatet.key' is found, or en exception is trown if not.
+        Paths with wildcards or slices like 'inputs.*' or '**.seed' return the list of all matches instead"""
 
         def pass_obj(obj: dict | tuple | list, key: str | int) -> dict | list | tuple:
             if isinstance(obj, dict):
@@ -18,7 +97,10 @@ class WorkFlowData(ComfyNodeABC):
                 except ValueError:
                     raise ValueError(f"Expected an integer index value for object <{obj}>")
 
-        return functools.reduce(pass_obj, keys.split('.'), data)
+        path = compile_path(path=keys)
+        if path.is_query:
+            return list(match_path(data, path.steps))
+        return functools.reduce(pass_obj, path.keys, data)
 
 
     def get_value(self, node: dict, keys: str) -> Any:
@@ -40,6 +122,10 @@ class GetWorkflowData(WorkFlowData):
     DESCRIPTION = f"""
         This node extracts data from the node that is
         connected to the {NODE_INPUT_NAME} input.
+        With a class_type, the data is taken from the nearest
+        node of that type upstream of the {NODE_INPUT_NAME} input,
+        or from the first one in the workflow if {NODE_INPUT_NAME}
+        is not connected.
         The field_value output is concatenated with
         value_prefix + field_value_str + value_suffix.
     """
@@ -54,6 +140,7 @@ class GetWorkflowData(WorkFlowData):
                     },
                 "optional": {
                     cls.NODE_INPUT_NAME: (IO.ANY, {}),
+                    "class_type": (IO.STRING, {"default": "", "tooltip": "Take the data from the nearest upstream node of this type, e.g. KSampler"}),
                 },
                 "hidden": {
                     "prompt": "PROMPT", 
@@ -65,19 +152,36 @@ class GetWorkflowData(WorkFlowData):
 
     def get_data(self, value_prefix:str, field_name:str, value_suffix:str,
                  prompt: dict, extra_pnginfo: dict, unique_id: str,
-                 node: Any | None = None,
+                 node: Any | None = None, class_type: str = "",
                  ) -> tuple[str, str, int, float, str]:
 
 
         this_node_data = prompt[unique_id]
+        # every output is produced, ComfyUI caches them regardless of which ones are connected:
+        workflow_json: str = self.memoize(prompt=prompt, key="workflow_json", function=lambda: json.dumps(extra_pnginfo))
+
+        try:
+            prev_node_id = str(this_node_data["inputs"][self.NODE_INPUT_NAME][0])
+        except (KeyError, TypeError):
+            prev_node_id = None
+
+        if class_type:
+            graph = self.prompt_graph(prompt=prompt)
+            if prev_node_id is not None:
+                prev_node_id = graph.upstream(node_id=prev_node_id, class_type=class_type)
+            elif (nodes := graph.nodes_of_type(class_type=class_type)):
+                prev_node_id = nodes[0]
+            if prev_node_id is None:
+                raise KeyError(f"Error: no node of type <{class_type}> found upstream of node {unique_id}")
 
         try:
-            prev_node_id = this_node_data["inputs"][self.NODE_INPUT_NAME][0]
             prev_node_data = prompt[prev_node_id]
-            node_data = json.dumps(prev_node_data)
-            print(f"GetWorkflowData: Node data = {node_data}")
         except (KeyError, TypeError):
-            return (json.dumps(extra_pnginfo), "", 0, 0.0, "")
+            return (workflow_json, "", 0, 0.0, "")
+
+        node_data: str = self.memoize(prompt=prompt, key=("node_data", prev_node_id), function=lambda: json.dumps(prev_node_data))
+        if self.VERBOSE:
+            print(f"GetWorkflowData: Node data = {node_data}")
 
         try:
             field_value = self.get_nested_value(data=prev_node_data, keys=field_name) if field_name else node_data
@@ -93,19 +197,39 @@ class GetWorkflowData(WorkFlowData):
 
         field_value = f"{value_prefix}{str(field_value)}{value_suffix}"
 
-        return (json.dumps(extra_pnginfo), field_value, value_int, value_float, node_data)
+        return (workflow_json, field_value, value_int, value_float, node_data)
 
 
 class GetGenerationData(WorkFlowData):
-    """Unpublished and untested"""
     RETURN_NAMES = "int_seed", "int_steps", "float_cfg", "float_denoise", "int_batch_size", "str_seed", "str_steps", "str_cfg", "str_denoise", "str_batch_size", "sampler", "scheduler",
     RETURN_TYPES = IO.INT, IO.INT, IO.FLOAT, IO.FLOAT, IO.INT, IO.STRING, IO.STRING, IO.STRING, IO.STRING, IO.STRING, IO.STRING, IO.STRING,
     FUNCTION = "get_data"
     CATEGORY = "Hangover"
 
+    DESCRIPTION = """
+        This node extracts the generation parameters
+        (seed, steps, cfg, denoise, sampler, scheduler and
+        batch size) from the sampler that is connected to
+        the ksampler input.
+    """
+
+    # generation parameter: (sampler input names, the first one found is used, default value)
+    FIELDS: dict[str, tuple[tuple[str, ...], Any]] = {
+        "seed": (("seed", "noise_seed"), 0),
+        "steps": (("steps",), 0),
+        "cfg": (("cfg",), 0.0),
+        "denoise": (("denoise",), 0.0),
+        "sampler_name": (("sampler_name",), ""),
+        "scheduler": (("scheduler",), ""),
+    }
+    # nodes whose batch_size input is the batch size of the latent they output, other nodes may rebatch or repeat it:
+    EMPTY_LATENT_TYPES: set[str] = {"EmptyLatentImage", "EmptySD3LatentImage", "EmptyHunyuanLatentVideo", "EmptyMochiLatentVideo",
+                                    "EmptyLTXVLatentVideo", "EmptyCosmosLatentVideo", "EmptyLatentAudio"}
+
+
     @classmethod
     def INPUT_TYPES(cls) -> InputTypeDict:
-        return {"required": {"ksampler": (IO.LATENT, {}),},
+        return {"required": {"ksampler": (IO.LATENT, {"lazy": True}),},
                 "hidden": {
                     "prompt": "PROMPT", 
                     "unique_id": "UNIQUE_ID",
@@ -113,27 +237,43 @@ class GetGenerationData(WorkFlowData):
                 }
 
 
-    def get_data(self, ksampler: dict[str, torch.Tensor], prompt: dict, unique_id: str
+    @classmethod
+    def generation_data(cls, prompt: dict, unique_id: str) -> dict[str, Any]:
+        """Collect all generation parameters of the connected sampler in one pass over its inputs, once per prompt and node"""
+        def collect() -> dict[str, Any]:
+            prev_node_id = str(prompt[unique_id]["inputs"]["ksampler"][0])
+            inputs: dict[str, Any] = prompt[prev_node_id].get("inputs", {})
+            data: dict[str, Any] = {}
+            for field, (input_names, default) in cls.FIELDS.items():
+                value = next((inputs[name] for name in input_names if name in inputs), default)
+                if isinstance(value, (list, dict)):
+                    print(f"Warning: Get Generation Data: geting values from connected inputs is not supported <{field}>")
+                    value = default
+                data[field] = value
+
+            # the batch size is only known from the prompt if the latent comes directly from e.g. an Empty Latent Image:
+            data["batch_size"] = None
+            if isinstance(latent := inputs.get("latent_image"), list) and (latent_node := prompt.get(str(latent[0]), {})).get("class_type") in cls.EMPTY_LATENT_TYPES:
+                batch_size = latent_node.get("inputs", {}).get("batch_size")
+                if isinstance(batch_size, int):
+                    data["batch_size"] = batch_size
+            return data
+
+        return cls.memoize(prompt=prompt, key=("generation_data", str(unique_id)), function=collect)
+
+
+    def check_lazy_status(self, prompt: dict, unique_id: str, ksampler: dict[str, torch.Tensor] | None = None) -> list[str]:
+        # the latent is only needed for its batch size, if the prompt does not tell it
+        return ["ksampler"] if self.generation_data(prompt=prompt, unique_id=unique_id)["batch_size"] is None else []
+
+
+    def get_data(self, prompt: dict, unique_id: str, ksampler: dict[str, torch.Tensor] | None = None
                  ) -> tuple[int, int, float, float, int, str, str, str, str, str, str, str]:
-        this_node_data = prompt[unique_id]
-        prev_node_id = this_node_data["inputs"]["ksampler"][0]
-        prev_node = prompt[prev_node_id]
-
-        if (seed := self.get_value(node=prev_node, keys="inputs.seed")) is None:
-            seed = 0
-        if (steps := self.get_value(node=prev_node, keys="inputs.steps")) is None:
-            steps = 0
-        if (cfg_scale := self.get_value(node=prev_node, keys="inputs.cfg")) is None:
-            cfg_scale = 0.0
-        if (denoise := self.get_value(node=prev_node, keys="inputs.denoise")) is None:
-            denoise = 0.0
-        if (sampler_name := self.get_value(node=prev_node, keys="inputs.sampler_name")) is None:
-            sampler_name = ""
-        if (scheduler_name := self.get_value(node=prev_node, keys="inputs.scheduler")) is None:
-            scheduler_name = ""
-        batch_size: int = ksampler["samples"].shape[0]
+        data = self.generation_data(prompt=prompt, unique_id=unique_id)
+        if (batch_size := data["batch_size"]) is None:
+            batch_size = ksampler["samples"].shape[0] if ksampler is not None else 0 # reads the shape only, the tensor stays where it is
 
+        seed, steps, cfg_scale, denoise = data["seed"], data["steps"], data["cfg"], data["denoise"]
         return (seed, steps, cfg_scale, denoise, batch_size, 
                 str(seed), str(steps), f"{cfg_scale:.2f}", f"{denoise:.2f}", str(batch_size), 
-                sampler_name, scheduler_name,)
-
+                data["sampler_name"], data["scheduler"],)
@@ -0,0 +1,40 @@
+"""
+@author: AlexL
+@title: ComfyUI-Hangover-Image_Convert
+@nickname: Hangover-Image_Convert
+@description: Converts ComfyUI image batches to uint8 arrays for Pillow, shared by all Hangover nodes that output images.
+"""
+import threading
+import torch
+from torch import Tensor
+from PIL import Image
+import numpy as np
+
+
+MIN_PINNED_BYTES = 4 * 1024 * 1024 # smaller results are copied with .cpu(), staging them does not pay off
+MAX_PINNED_BYTES = 256 * 1024 * 1024 # larger results are copied with .cpu(), so the staging buffer stays bounded
+_staging: Tensor | None = None # pinned host buffer reused by all calls, page locked memory is expensive to allocate
+_staging_lock = threading.Lock()
+
+
+def to_uint8(images: Tensor) -> np.ndarray:
+    """Scale, clamp and cast a [batch, height, width, channels] image tensor with values 0..1 to uint8 in one pass
+    on the tensor's own device, only the uint8 result is transferred to the host. Same values as
+    np.clip(255. * image.cpu().numpy(), 0, 255).astype(np.uint8): fractions are truncated, not rounded."""
+    global _staging
+    with torch.no_grad():
+        result = images.mul(255.).clamp_(0, 255).to(dtype=torch.uint8)
+    if result.device.type == "cuda" and MIN_PINNED_BYTES <= result.numel() <= MAX_PINNED_BYTES:
+        with _staging_lock:
+            if _staging is None or _staging.numel() < result.numel():
+                _staging = torch.empty(size=(result.numel(),), dtype=torch.uint8, pin_memory=True)
+            staging = _staging[:result.numel()].view(result.shape)
+            staging.copy_(result, non_blocking=True) # copied by DMA
+            torch.cuda.current_stream(device=result.device).synchronize()
+            return staging.numpy().copy() # the buffer is reused, the result must not be a view of it
+    return result.cpu().contiguous().numpy() # on the cpu, neither .cpu() nor .numpy() copy
+
+
+def to_pil_images(images: Tensor) -> list[Image.Image]:
+    """All images of the batch as Pillow images, created from views of one uint8 array"""
+    return [Image.fromarray(obj=image) for image in to_uint8(images=images)]
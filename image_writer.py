@@ -0,0 +1,111 @@
+"""
+@author: AlexL
+@title: ComfyUI-Hangover-Image_Writer
+@nickname: Hangover-Image_Writer
+@description: Encodes and writes images on background threads, so the ComfyUI executor does not wait for the disk.
+"""
+import atexit
+import os
+import queue
+import threading
+from typing import Any
+from PIL import Image
+import numpy as np
+
+
+class BackgroundImageWriter:
+    """A queue of images that are encoded and written by up to num_threads background threads.
+    The memory of the queued images is bounded, submit() blocks while the queue is full."""
+
+    MAX_PENDING_BYTES = 1024 * 1024 * 1024
+    WARN_DEPTH = 16 # print a note when more images are waiting, the disk does not keep up
+
+    def __init__(self, max_pending_bytes: int = MAX_PENDING_BYTES, num_threads: int = 1) -> None:
+        self.max_pending_bytes = max_pending_bytes
+        self.num_threads = num_threads
+        self._queue: queue.Queue[tuple[str, np.ndarray, dict[str, Any], int, tuple[str, str]]] = queue.Queue()
+        self._condition = threading.Condition()
+        self._pending_bytes = 0
+        self._depth = 0
+        self._counters: dict[tuple[str, str], list[int]] = {} # (folder, filename) -> [next counter after the reserved ones, queued images]
+        self._threads: list[threading.Thread] = []
+        atexit.register(self.flush)
+
+
+    @property
+    def depth(self) -> int:
+        """The number of images waiting to be written"""
+        return self._depth
+
+
+    @staticmethod
+    def _key(folder: str, filename: str) -> tuple[str, str]:
+        return os.path.normcase(os.path.abspath(folder)), filename
+
+
+    def reserve_counter(self, folder: str, filename: str, counter: int, count: int, reserve: bool = True) -> int:
+        """ComfyUI numbers files by the files that exist, the counters of queued files are not on disk yet.
+        Returns the first of count consecutive counters that are free on disk and in the queue, and reserves them
+        for the images submitted with the same filename. With reserve False, the counters are not reserved, e.g.
+        for images that are written right away. Without queued images, the counter is the one of ComfyUI."""
+        with self._condition:
+            key = self._key(folder=folder, filename=filename)
+            if key in self._counters:
+                counter = max(counter, self._counters[key][0])
+            if reserve: # the count images are expected to be submitted, the reservation lasts until they are written
+                reservation = self._counters.setdefault(key, [0, 0])
+                reservation[0] = counter + count
+                reservation[1] += count
+            return counter
+
+
+    def submit(self, path: str, image: np.ndarray, save_kwargs: dict[str, Any], max_size: int = 0, filename: str = "") -> None:
+        """Queue the image to be saved to path with Image.save(**save_kwargs), downscaled to max_size if > 0.
+        filename is the one its counter was reserved with, the reservation is dropped when all its images are written."""
+        key = self._key(folder=os.path.dirname(path), filename=filename)
+        with self._condition:
+            if self._depth and self._pending_bytes + image.nbytes > self.max_pending_bytes:
+                print(f"Save Image w/o Metadata: {self._depth} images are waiting to be written, waiting for the disk")
+                self._condition.wait_for(lambda: not self._depth or self._pending_bytes + image.nbytes <= self.max_pending_bytes)
+            self._pending_bytes += image.nbytes
+            self._depth += 1
+            if self._depth > self.WARN_DEPTH:
+                print(f"Save Image w/o Metadata: {self._depth} images are waiting to be written")
+            if len(self._threads) < min(self.num_threads, self._depth): # threads are started on demand
+                self._threads.append(threading.Thread(target=self._write_images, name="Hangover image writer", daemon=True))
+                self._threads[-1].start()
+        self._queue.put((path, image, save_kwargs, max_size, key))
+
+
+    def _write_images(self) -> None:
+        while True:
+            path, image, save_kwargs, max_size, key = self._queue.get()
+            temp_path = path + ".tmp" # the file appears under its name only when it is complete
+            try:
+                pil_image = Image.fromarray(obj=image)
+                if max_size:
+                    pil_image.thumbnail(size=(max_size, max_size), resample=Image.Resampling.BILINEAR)
+                pil_image.save(temp_path, **save_kwargs)
+                os.replace(temp_path, path)
+            except Exception as e:
+                print(f"Save Image w/o Metadata: Error writing {path}: {e}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            finally:
+                with self._condition:
+                    self._pending_bytes -= image.nbytes
+                    self._depth -= 1
+                    if (reservation := self._counters.get(key)) is not None:
+                        reservation[1] -= 1
+                        if not reservation[1]: # the files are on disk, ComfyUI's numbering takes over again
+                            del self._counters[key]
+                    self._condition.notify_all()
+                self._queue.task_done()
+
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until all queued images are written, returns False on timeout"""
+        with self._condition:
+            if self._depth:
+                print(f"Save Image w/o Metadata: writing {self._depth} queued images")
+            return self._condition.wait_for(lambda: not self._depth, timeout=timeout)
@@ -4,10 +4,42 @@
 @nickname: Hangover-Sympy_Interpreter
 @description: A mathematic expression interpreter based on the sympy library
 """
-from sympy.parsing.sympy_parser import parse_expr
+import atexit
+import functools
 import math
-from typing import Any
+import numpy as np
+from typing import Any, Callable
 from comfy.comfy_types.node_typing import ComfyNodeABC, IO, InputTypeDict
+from .numeric_evaluator import evaluate
+from .sympy_worker import SympyWorkerPool, evaluate_symbolic
+
+
+@functools.lru_cache(maxsize=1024)
+def evaluate_memoized(expression: str, variables: tuple[tuple[str, type, Any], ...], timeout: float) -> tuple[int, float, str]:
+    """Evaluate the expression with sympy, in a worker process if there is a timeout. The results are memoized by the
+    expression and the variable values, including their type because 1 and 1.0 are evaluated differently."""
+    kwargs = {name: value for name, _, value in variables}
+    if timeout > 0:
+        return Sympy_Interpreter.Worker_Pool.evaluate(expression=expression, variables=kwargs, timeout=timeout)
+    return evaluate_symbolic(expression=expression, variables=kwargs)
+
+
+@functools.lru_cache(maxsize=64)
+def lambdify_expression(expression: str, variables: tuple[str, ...]) -> Callable[..., Any]:
+    """Parse the expression with the variables as free symbols and compile it into a vectorized numpy function"""
+    from sympy import Symbol, lambdify
+    from sympy.parsing.sympy_parser import parse_expr
+    symbols = [Symbol(name) for name in variables]
+    expr = parse_expr(s=expression)
+    if (unknown := {str(symbol) for symbol in expr.free_symbols} - set(variables)):
+        raise ValueError(f"Expression '{expression}' cannot be evaluated numerically, unknown or unconnected symbol(s): {', '.join(sorted(unknown))}")
+    return lambdify(symbols, expr, modules="numpy")
+
+
+def to_array(values: list[Any]) -> np.ndarray:
+    """Flatten a list of numbers, lists and tensors into a 1-D float array"""
+    arrays = [np.ravel(value.detach().cpu().numpy() if hasattr(value, "detach") else np.asarray(value, dtype=np.float64)) for value in values]
+    return np.concatenate(arrays).astype(np.float64) if arrays else np.empty(0)
 
 
 class Sympy_Interpreter(ComfyNodeABC):
@@ -20,12 +52,15 @@ class Sympy_Interpreter(ComfyNodeABC):
 
     Config = {
         "num_vars": 6,
+        "timeout": 0.0, # seconds, > 0: symbolic expressions are evaluated in worker processes and stopped after the timeout
+        "num_workers": 2,
     }
 
 
     # Define the input variables dictionary:
     Input_Vars: list[str] = [chr(c + ord("a")) for c in range(Config["num_vars"])]
     Variables: dict[str, tuple] = {key: (IO.NUMBER,) for key in Input_Vars}
+    Worker_Pool = SympyWorkerPool(max_workers=Config["num_workers"]) # worker processes are started on first use
 
     @classmethod
     def INPUT_TYPES(cls) -> InputTypeDict:
@@ -41,16 +76,46 @@ class Sympy_Interpreter(ComfyNodeABC):
         """ Evaluate the expression and return the results.  """
         
         print(f"Math_Interpreter: evaluating expression A({expression})")
-        expr_A = parse_expr(s=expression, local_dict=kwargs)
-        try:
-            result_A = float(expr_A)
-        except TypeError:
-            result_A = 0.0
+        if (result := evaluate(expression=expression, variables=kwargs)) is not None:
+            result_A, str_A = result # plain arithmetic, evaluated without sympy
+            return math.floor(result_A), result_A, str_A
+
+        return evaluate_memoized(expression=expression, variables=tuple((name, type(value), value) for name, value in sorted(kwargs.items())), timeout=self.Config["timeout"])
+
+
+atexit.register(Sympy_Interpreter.Worker_Pool.close)
+
+
+class Sympy_Interpreter_Batch(Sympy_Interpreter):
+    DESCRIPTION = """
+        Vectorized version of the Sympy Math Interpreter.
+        The inputs a..f can be numbers, lists or 1-D tensors, the expression
+        is evaluated once with numpy for all values. Inputs must either have
+        the same length or a single value. Outputs are lists.
+    """
+
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = True, True, True,
+    Variables: dict[str, tuple] = {key: (IO.ANY,) for key in Sympy_Interpreter.Input_Vars}
+
+    def calc(self, expression: list[str], **kwargs: list[Any]) -> tuple[list[int], list[float], list[str]]: # type: ignore
+        """ Evaluate the expression for all input values at once and return the results as lists. """
+
+        print(f"Math_Interpreter: evaluating expression A({expression[0]}) vectorized")
+        arrays = {name: to_array(values=values) for name, values in sorted(kwargs.items())}
+        if len(lengths := {len(array) for array in arrays.values()} - {1}) > 1:
+            raise ValueError(f"Sympy Math Interpreter Batch: inputs must have the same length or a single value, got lengths {sorted(lengths)}")
+
+        function = lambdify_expression(expression=expression[0], variables=tuple(arrays))
+        with np.errstate(all="ignore"): # e.g. 1/0 or sqrt(-1) of a single value, handled below
+            result_A = np.broadcast_to(np.asarray(function(*arrays.values()), dtype=np.float64), (max(lengths, default=1),))
+        # like the single node, non-finite results (inf, nan) are 0 and 0.0, the str output keeps them:
+        finite_A = np.where(np.isfinite(result_A), result_A, 0.0)
 
         return (
-            math.floor(result_A),
-            result_A,
-            str(expr_A),
+            [math.floor(value) for value in finite_A.tolist()],
+            finite_A.tolist(),
+            [str(value) for value in result_A.tolist()],
         )
 
 
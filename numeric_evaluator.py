@@ -0,0 +1,247 @@
+"""
+@author: AlexL
+@title: ComfyUI-Hangover-Numeric_Evaluator
+@nickname: Hangover-Numeric_Evaluator
+@description: A fast evaluator for plain arithmetic expressions, used by the Sympy Math Interpreter before it falls back to sympy.
+It gives exactly the same results as parse_expr() would, without importing sympy.
+"""
+import ast
+import functools
+import math
+import operator
+import re
+import sys
+from fractions import Fraction
+from typing import Any, Callable
+
+
+class NotNumeric(Exception):
+    """The expression cannot be evaluated exactly like sympy would, it has to be evaluated by sympy"""
+
+
+# parse_expr() turns number literals into sympy numbers, but leaves the input variables as python numbers.
+# Python numbers are kept as they are, sympy numbers are tagged tuples (kind, value):
+INTEGER, RATIONAL, FLOAT, BOOLEAN = "Integer", "Rational", "Float", "Boolean"
+MAX_EXPONENT = 1024 # larger exponents of exact numbers are left to sympy
+INTEGER_LITERAL = re.compile(pattern=r'^\d+$')
+FLOAT_LITERAL = re.compile(pattern=r'^(\d*)\.(\d*)$') # sympy picks the precision of exponent literals from their value
+
+Value = int | float | bool | tuple[str, Any]
+Evaluator = Callable[[dict[str, Any]], Value]
+
+
+def to_float(value: float) -> tuple[str, float]:
+    """A sympy Float. mpmath has no infinities, signed zeros or subnormals like ieee floats and sympy turns
+    some zero Floats into Integers, these are left to sympy."""
+    if not math.isfinite(value) or abs(value) < sys.float_info.min:
+        raise NotNumeric
+    return FLOAT, value
+
+
+def to_exact(value: Fraction | int) -> tuple[str, Any]:
+    if isinstance(value, Fraction) and value.denominator != 1:
+        return RATIONAL, value
+    return INTEGER, int(value)
+
+
+def sympify(value: Value) -> tuple[str, Any]:
+    """Convert a python number into a sympy number, like sympy does for mixed operations"""
+    if isinstance(value, tuple):
+        return value
+    if isinstance(value, bool):
+        raise NotNumeric # sympy turns it into S.true / S.false
+    if isinstance(value, int):
+        return INTEGER, value
+    return to_float(value=value)
+
+
+def numeric(value: Value) -> tuple[str, Any]:
+    if (value := sympify(value=value))[0] == BOOLEAN:
+        raise NotNumeric
+    return value
+
+
+def unary_operation(op: Callable[[Any], Any], x: Value) -> Value:
+    if not isinstance(x, tuple):
+        return op(x)
+    kind, value = numeric(value=x)
+    return to_float(value=op(value)) if kind == FLOAT else (kind, op(value))
+
+
+def binary_operation(op: Callable[[Any, Any], Any], x: Value, y: Value) -> Value:
+    if not isinstance(x, tuple) and not isinstance(y, tuple): # plain python arithmetic, just like in sympy
+        if isinstance(result := op(x, y), complex):
+            raise NotNumeric
+        return result
+
+    reciprocal = not isinstance(x, tuple) or x[0] != FLOAT # only Float / number divides directly, everything else is x * (1/y)
+    (kind_x, x), (kind_y, y) = numeric(value=x), numeric(value=y)
+    if FLOAT in (kind_x, kind_y): # mpmath rounds +, -, *, / at 53 bits exactly like ieee floats do
+        if op is operator.truediv and reciprocal:
+            return to_float(value=float(x) * (1.0 / y if kind_y == FLOAT else float(1 / Fraction(y))))
+        if op not in (operator.add, operator.sub, operator.mul, operator.truediv):
+            raise NotNumeric
+        return to_float(value=op(float(x), float(y)))
+    if op is operator.pow:
+        if kind_y != INTEGER or abs(y) > MAX_EXPONENT:
+            raise NotNumeric
+        return to_exact(value=Fraction(x) ** y)
+    if kind_x == INTEGER and kind_y == INTEGER:
+        if op is operator.truediv:
+            return (INTEGER, x // y) if x % y == 0 else (RATIONAL, Fraction(x, y))
+        return INTEGER, op(x, y)
+    if op in (operator.floordiv, operator.mod):
+        raise NotNumeric
+    return to_exact(value=op(Fraction(x), Fraction(y)))
+
+
+def compare(op: Callable[[Any, Any], bool], x: Value, y: Value) -> Value:
+    if not isinstance(x, tuple) and not isinstance(y, tuple):
+        return op(x, y)
+    if op in (operator.eq, operator.ne):
+        raise NotNumeric # sympy compares numbers structurally, Float(2.0) != Integer(2)
+    (kind_x, x), (kind_y, y) = numeric(value=x), numeric(value=y)
+    if {kind_x, kind_y} == {RATIONAL, FLOAT}:
+        raise NotNumeric
+    return BOOLEAN, op(x, y)
+
+
+def floor(x: Value) -> Value:
+    return INTEGER, math.floor(numeric(value=x)[1])
+
+
+def ceiling(x: Value) -> Value:
+    return INTEGER, math.ceil(numeric(value=x)[1])
+
+
+def python_abs(x: Value) -> Value:
+    if not isinstance(x, tuple):
+        return abs(x)
+    kind, value = numeric(value=x)
+    return kind, abs(value)
+
+
+def sympy_abs(x: Value) -> Value:
+    kind, value = numeric(value=x)
+    return kind, abs(value)
+
+
+def python_round(*args: Value) -> Value:
+    if any(isinstance(arg, tuple) for arg in args):
+        raise NotNumeric
+    return round(*args)
+
+
+def extremum(function: Callable[..., Any], *args: Value) -> Value:
+    """Min() and Max() of numbers, ties between different kinds of numbers are left to sympy"""
+    values = [numeric(value=arg) for arg in args]
+    if not values or {RATIONAL, FLOAT} <= {kind for kind, _ in values}:
+        raise NotNumeric
+    result = function(values, key=lambda value: value[1])
+    if any(value[1] == result[1] and value[0] != result[0] for value in values):
+        raise NotNumeric
+    return result
+
+
+def sqrt(x: Value) -> Value:
+    kind, value = numeric(value=x)
+    if kind == INTEGER and value >= 0 and math.isqrt(value) ** 2 == value:
+        return INTEGER, math.isqrt(value)
+    if kind == FLOAT and value > 0:
+        return to_float(value=math.sqrt(value))
+    raise NotNumeric
+
+
+BINARY_OPERATORS: dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+COMPARE_OPERATORS: dict[type, Callable[[Any, Any], bool]] = {
+    ast.Lt: operator.lt, ast.Gt: operator.gt, ast.LtE: operator.le, ast.GtE: operator.ge, ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+FUNCTIONS: dict[str, Callable[..., Value]] = {
+    "floor": floor, "ceiling": ceiling, "abs": python_abs, "Abs": sympy_abs, "round": python_round, "sqrt": sqrt,
+    "min": functools.partial(extremum, min), "Min": functools.partial(extremum, min),
+    "max": functools.partial(extremum, max), "Max": functools.partial(extremum, max),
+}
+
+
+def compile_node(node: ast.AST, expression: str, variables: tuple[str, ...]) -> Evaluator:
+    """Compile an ast node into a closure, raises NotNumeric for anything the evaluator does not support"""
+    match node:
+        case ast.Constant(value=bool()):
+            raise NotNumeric
+        case ast.Constant(value=int() as value) if INTEGER_LITERAL.match(ast.get_source_segment(expression, node) or ""):
+            result = INTEGER, value
+            return lambda variables: result
+        case ast.Constant(value=float() as value):
+            literal = FLOAT_LITERAL.match(ast.get_source_segment(expression, node) or "")
+            if not literal or len(literal[1] + literal[2]) > 15: # sympy gives Floats with more digits a higher precision
+                raise NotNumeric
+            result = to_float(value=value)
+            return lambda variables: result
+        case ast.Name(id=name) if name in variables:
+            return lambda variables: variables[name]
+        case ast.UnaryOp(op=ast.USub() | ast.UAdd() as op, operand=operand):
+            operand_evaluator = compile_node(node=operand, expression=expression, variables=variables)
+            unary_op = operator.neg if isinstance(op, ast.USub) else operator.pos
+            return lambda variables: unary_operation(unary_op, operand_evaluator(variables))
+        case ast.BinOp(left=left, op=op, right=right) if type(op) in BINARY_OPERATORS:
+            left_evaluator = compile_node(node=left, expression=expression, variables=variables)
+            right_evaluator = compile_node(node=right, expression=expression, variables=variables)
+            binary_op = BINARY_OPERATORS[type(op)]
+            return lambda variables: binary_operation(binary_op, left_evaluator(variables), right_evaluator(variables))
+        case ast.Compare(left=left, ops=[op], comparators=[right]) if type(op) in COMPARE_OPERATORS:
+            left_evaluator = compile_node(node=left, expression=expression, variables=variables)
+            right_evaluator = compile_node(node=right, expression=expression, variables=variables)
+            compare_op = COMPARE_OPERATORS[type(op)]
+            return lambda variables: compare(compare_op, left_evaluator(variables), right_evaluator(variables))
+        case ast.Call(func=ast.Name(id=name), args=args, keywords=[]) if name in FUNCTIONS and name not in variables and not any(isinstance(arg, ast.Starred) for arg in args):
+            function = FUNCTIONS[name]
+            arg_evaluators = [compile_node(node=arg, expression=expression, variables=variables) for arg in args]
+            return lambda variables: function(*(evaluator(variables) for evaluator in arg_evaluators))
+    raise NotNumeric
+
+
+@functools.lru_cache(maxsize=256)
+def compile_numeric(expression: str, variables: tuple[str, ...]) -> Evaluator | None:
+    """Compile the expression for the numeric evaluator, or None if it needs sympy"""
+    try:
+        return compile_node(node=ast.parse(source=expression.strip(), mode="eval").body, expression=expression.strip(), variables=variables)
+    except (SyntaxError, ValueError, NotNumeric):
+        return None
+
+
+def format_float(value: float) -> str:
+    """str() of a sympy Float with the default precision of 15 digits"""
+    from mpmath.libmp import to_str, from_float # mpmath comes with sympy, but imports much faster
+    text = to_str(from_float(value), 15, strip_zeros=False)
+    if text.startswith("-.0"):
+        return "-0." + text[3:]
+    if text.startswith(".0"):
+        return "0." + text[2:]
+    return text
+
+
+def evaluate(expression: str, variables: dict[str, Any]) -> tuple[float, str] | None:
+    """Evaluate a plain arithmetic expression like the Sympy Math Interpreter does, return float(result) and str(result).
+    Returns None if the expression needs sympy."""
+    if not all(type(value) in (int, float) for value in variables.values()):
+        return
+    if (evaluator := compile_numeric(expression=expression, variables=tuple(sorted(variables)))) is None:
+        return
+
+    try:
+        match evaluator(variables):
+            case (str() as kind, value):
+                if kind == BOOLEAN:
+                    return 0.0, str(value) # float() of a sympy boolean raises a TypeError, which the interpreter turns into 0.0
+                if kind == INTEGER:
+                    return float(value), str(value)
+                if kind == RATIONAL:
+                    return float(value), f"{value.numerator}/{value.denominator}"
+                return value, format_float(value=value)
+            case value:
+                return float(value), str(value)
+    except (NotNumeric, ArithmeticError, ValueError, TypeError):
+        return
@@ -0,0 +1,58 @@
+"""
+@author: AlexL
+@title: ComfyUI-Hangover-Prompt_Graph
+@nickname: Hangover-Prompt_Graph
+@description: An index of the node graph of a ComfyUI prompt, built once per prompt and shared by the Hangover data nodes.
+"""
+from collections import deque
+from typing import Any
+
+
+class PromptGraph:
+    """Class types and links of the nodes of a prompt (the api format of the workflow that is executed)"""
+
+    def __init__(self, prompt: dict[str, Any]) -> None:
+        self.prompt = prompt
+        self.nodes_by_class: dict[str, list[str]] = {}
+        self.parents: dict[str, list[str]] = {} # node id -> ids of the nodes connected to its inputs, in input order
+        self._upstream: dict[tuple[str, str], str | None] = {}
+
+        for node_id, node in prompt.items():
+            node_id = str(node_id)
+            self.nodes_by_class.setdefault(node.get("class_type", ""), []).append(node_id)
+            parents = self.parents.setdefault(node_id, [])
+            for value in node.get("inputs", {}).values():
+                if isinstance(value, list) and len(value) == 2 and isinstance(value[1], int):
+                    parent_id = str(value[0])
+                    if parent_id not in parents:
+                        parents.append(parent_id)
+
+
+    def nodes_of_type(self, class_type: str) -> list[str]:
+        """The ids of all nodes of the class type, in prompt order"""
+        return self.nodes_by_class.get(class_type, [])
+
+
+    def upstream(self, node_id: str, class_type: str) -> str | None:
+        """The id of the nearest node of the class type that the node depends on, the node itself included.
+        Nodes with the same distance are resolved in input order. The results are memoized."""
+        key = str(node_id), class_type
+        if key not in self._upstream:
+            self._upstream[key] = self._search_upstream(node_id=str(node_id), class_type=class_type)
+        return self._upstream[key]
+
+
+    def _search_upstream(self, node_id: str, class_type: str) -> str | None:
+        if not self.nodes_of_type(class_type=class_type):
+            return None
+        visited: set[str] = {node_id}
+        queue: deque[str] = deque([node_id])
+        while queue:
+            current = queue.popleft()
+            if self.prompt.get(current, {}).get("class_type") == class_type:
+                return current
+            for parent_id in self.parents.get(current, []):
+                if parent_id not in visited:
+                    visited.add(parent_id)
+                    queue.append(parent_id)
+        return None
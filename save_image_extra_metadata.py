@@ -4,14 +4,30 @@
 @nickname: Hangover-Save_Image_Extra_Metadata
 @description: Display, save or not save image, with or without extra metadata.
 """
-from typing import Any
+from typing import Any, NamedTuple
 from nodes import SaveImage
 import folder_paths
+import json
+import os
 import random
+from hashlib import sha256
+from concurrent.futures import ThreadPoolExecutor
 from torch import Tensor
 from PIL import Image
+from PIL.PngImagePlugin import PngInfo
 import numpy as np
+from comfy.cli_args import args
 from comfy.comfy_types.node_typing import IO, InputTypeDict
+from .image_writer import BackgroundImageWriter
+from .image_convert import to_pil_images, to_uint8
+
+
+class SaveTarget(NamedTuple):
+    output_dir: str
+    type: str # output or temp
+    prefix_append: str
+    compress_level: int
+    max_size: int = 0 # > 0: images are downscaled to this size of the longer edge
 
 
 class SaveImage_NoWorkflow(SaveImage):
@@ -22,6 +38,7 @@ class SaveImage_NoWorkflow(SaveImage):
 
     def __init__(self) -> None:
         super().__init__()
+        self.target = SaveTarget(output_dir=self.output_dir, type=self.type, prefix_append=self.prefix_append, compress_level=self.compress_level)
 
     input_types = {"required": 
                     {"images": ("IMAGE", ), 
@@ -47,6 +64,15 @@ class SaveImage_NoWorkflow(SaveImage):
                 "include_workflow": (IO.BOOLEAN, {"default": True}),
                 "copy_to_clipboard": (IO.BOOLEAN, {"default": False}),
             },
+            "optional": {
+                "format": (list(cls.FORMATS), {"default": "png", "tooltip": "png_fast: lossless with the fastest compression"}),
+                "quality": (IO.INT, {"default": 90, "min": 1, "max": 100, "tooltip": "webp, avif and jpeg quality"}),
+                "effort": (IO.INT, {"default": 4, "min": 0, "max": 9, "tooltip": "CPU time spent on smaller files, png: compress level"}),
+                "metadata": (cls.METADATA_MODES, {"default": "embedded", "tooltip": "compressed: zTXt png chunks, sidecar: the workflow is written once to the workflows folder, the images only reference it. ComfyUI cannot load the workflow from compressed png or sidecar images, only from the sidecar json files"}),
+                "preview_max_size": (IO.INT, {"default": 0, "min": 0, "max": 16384, "step": 64, "tooltip": "Previews (save_image off) are downscaled to this size, 0: full size"}),
+                "preview_images": (IO.INT, {"default": 0, "min": 0, "max": 4096, "tooltip": "Previews (save_image off) of only the first images of the batch, 0: all"}),
+                "async_save": (IO.BOOLEAN, {"default": False, "tooltip": "Encode and write the images in the background, the node shows no previews of images that are not written when it returns"}),
+            },
             "hidden": {
                 "prompt": "PROMPT", 
                 "extra_pnginfo": "EXTRA_PNGINFO",
@@ -59,10 +85,28 @@ class SaveImage_NoWorkflow(SaveImage):
     OUTPUT_NODE = True
     CATEGORY = "Hangover"
 
+    # format: file extension, Pillow format
+    FORMATS: dict[str, tuple[str, str]] = {
+        "png": ("png", "PNG"),
+        "png_fast": ("png", "PNG"),
+        "webp": ("webp", "WEBP"),
+        "webp_lossless": ("webp", "WEBP"),
+        "avif": ("avif", "AVIF"),
+        "jpeg": ("jpg", "JPEG"),
+    }
+    MAX_JPEG_EXIF_BYTES = 65533 # a jpeg APP1 segment cannot hold more
+    METADATA_MODES: list[str] = ["embedded", "compressed", "sidecar"]
+    SIDECAR_FOLDER = "workflows"
+    _warned_metadata: set[str] = set() # metadata modes that have been warned about once
+    ENCODE_WORKERS: int = min(8, os.cpu_count() or 1) # threads used to encode the images of a batch
+    Writer = BackgroundImageWriter(num_threads=ENCODE_WORKERS) # shared by all nodes, flushed when ComfyUI exits
+
 
     def save_images(self, images: Tensor, filename_prefix: str = "ComfyUI", 
                     prompt: dict | None = None, extra_pnginfo: dict | None = None, 
-                    save_image: bool = True, include_workflow: bool = True, copy_to_clipboard: bool = False
+                    save_image: bool = True, include_workflow: bool = True, copy_to_clipboard: bool = False,
+                    format: str = "png", quality: int = 90, effort: int = 4, metadata: str = "embedded",
+                    preview_max_size: int = 0, preview_images: int = 0, async_save: bool = False,
                     ) -> dict[str, dict[str, list]]:
         
         if not include_workflow:
@@ -84,17 +128,124 @@ class SaveImage_NoWorkflow(SaveImage):
             if images.shape[0] > 1:
                 print(f"Note: copy batched images to the clipboard is not supported, picking the first one")
 
-            img = np.clip(images[0].cpu().numpy() * 255., a_min=0, a_max=255).astype(dtype=np.uint8)
-            copy(image=Image.fromarray(obj=img)) # type: ignore
-
-
-        if save_image:
-            self.__init__()
+            copy(image=to_pil_images(images=images[:1])[0]) # type: ignore
+
+
+        target = self.target
+        if not save_image:
+            target = SaveTarget(output_dir=folder_paths.get_temp_directory(), type="temp",
+                                prefix_append="_temp_" + ''.join(random.choice("abcdefghijklmnopqrstupvxyz") for x in range(5)),
+                                compress_level=1, max_size=preview_max_size)
+            if preview_images:
+                images = images[:preview_images]
+
+        save_kwargs = self.save_options(target=target, format=format, quality=quality, effort=effort, prompt=prompt, extra_pnginfo=extra_pnginfo, metadata=metadata)
+        return self.write_images(target=target, images=images, filename_prefix=filename_prefix, extension=self.FORMATS[format][0], save_kwargs=save_kwargs, async_save=async_save)
+
+
+    def save_options(self, target: SaveTarget, format: str, quality: int, effort: int, prompt: dict | None, extra_pnginfo: dict | None, metadata: str = "embedded") -> dict[str, Any]:
+        """The Image.save() arguments of the format, with the prompt and the workflow as metadata. Formats other than png
+        store them in exif tags, like ComfyUI's webp nodes do, so the workflow can be loaded from the image.
+        metadata 'compressed' stores compressed png chunks, 'sidecar' stores only references to json files.
+        ComfyUI reads neither of them, these images cannot be dropped into ComfyUI to load the workflow."""
+        extension, pil_format = self.FORMATS[format]
+        if format == "avif":
+            import pillow_avif # this adds avif support to Pillow
+
+        save_kwargs: dict[str, Any] = {"format": pil_format}
+        if format == "png":
+            save_kwargs["compress_level"] = target.compress_level if target.type == "temp" else effort # previews are always fast
+        elif format == "png_fast":
+            save_kwargs["compress_level"] = 1
+        elif format == "webp":
+            save_kwargs.update(quality=quality, method=round(effort * 6 / 9))
+        elif format == "webp_lossless":
+            save_kwargs.update(lossless=True, quality=round(effort * 100 / 9), method=round(effort * 6 / 9))
+        elif format == "avif":
+            save_kwargs.update(quality=quality, speed=10 - round(effort * 10 / 9))
+        elif format == "jpeg":
+            save_kwargs.update(quality=quality, optimize=effort >= 5)
+
+        if args.disable_metadata or (prompt is None and extra_pnginfo is None):
+            return save_kwargs
+
+        # serialized once per batch, all images share the metadata:
+        items: dict[str, str] = {"prompt": json.dumps(prompt)} if prompt is not None else {}
+        items.update({x: json.dumps(extra_pnginfo[x]) for x in extra_pnginfo or {}})
+        if metadata == "sidecar" or (metadata == "compressed" and pil_format == "PNG"):
+            if metadata not in self._warned_metadata:
+                self._warned_metadata.add(metadata)
+                print(f"Warning: Save Image w/o Metadata: ComfyUI cannot load the workflow from images saved with metadata '{metadata}'"
+                      + (f", load the json file from the {self.SIDECAR_FOLDER} folder instead" if metadata == "sidecar" else ", use embedded to keep them loadable"))
+        if metadata == "sidecar":
+            items = {f"{key}_ref": self.write_sidecar(output_dir=target.output_dir, text=text) for key, text in items.items()}
+
+        if pil_format == "PNG":
+            pnginfo = PngInfo()
+            for key, text in items.items():
+                pnginfo.add_text(key, text, zip=metadata == "compressed") # compressed: zTXt instead of tEXt chunks
+            save_kwargs["pnginfo"] = pnginfo
+            return save_kwargs
+
+        exif = Image.Exif()
+        tag = 0x010f # Make, then descending tags
+        for key, text in items.items():
+            if key in ("prompt", "prompt_ref"):
+                exif[0x0110] = f"{key}:{text}" # Model
+            else:
+                exif[tag] = f"{key}:{text}"
+                tag -= 1
+        exif_bytes = exif.tobytes()
+        if pil_format == "JPEG" and len(exif_bytes) > self.MAX_JPEG_EXIF_BYTES:
+            print(f"Warning: Save Image w/o Metadata: the workflow is too large for jpeg metadata ({len(exif_bytes)} bytes), it is not included, use png, webp or the sidecar metadata")
+            return save_kwargs
+        save_kwargs["exif"] = exif_bytes
+        return save_kwargs
+
+
+    def write_sidecar(self, output_dir: str, text: str) -> str:
+        """Write the json text to a content addressed file in the workflows folder of the output directory,
+        once for all images and batches with the same workflow. Returns its path relative to the output directory."""
+        name = f"{self.SIDECAR_FOLDER}/{sha256(text.encode(encoding='utf-8')).hexdigest()}.json"
+        path = os.path.join(output_dir, name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
+        return name
+
+
+    def write_images(self, target: SaveTarget, images: Tensor, filename_prefix: str, extension: str, save_kwargs: dict[str, Any], async_save: bool = False) -> dict[str, dict[str, list]]:
+        """Same as SaveImage.save_images(), with the same file names, but the images of a batch are encoded
+        in parallel by up to ENCODE_WORKERS threads, or by the background writer with async_save"""
+        filename_prefix += target.prefix_append
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, target.output_dir, images[0].shape[1], images[0].shape[0])
+        arrays = to_uint8(images=images) # the whole batch at once, the encoders get views of it
+
+        # only queued images reserve their counters, otherwise the numbering is ComfyUI's.
+        # a reservation is released when its images are written, nothing may fail between reserving and submitting:
+        counter = self.Writer.reserve_counter(folder=full_output_folder, filename=filename, counter=counter, count=len(images), reserve=async_save)
+
+        # the file names are assigned in batch order before any image is encoded:
+        files = [f"{filename.replace('%batch_num%', str(batch_number))}_{counter + batch_number:05}_.{extension}" for batch_number in range(len(images))]
+
+        def save(file: str, image: np.ndarray) -> None:
+            pil_image = Image.fromarray(obj=image)
+            if target.max_size:
+                pil_image.thumbnail(size=(target.max_size, target.max_size), resample=Image.Resampling.BILINEAR)
+            pil_image.save(os.path.join(full_output_folder, file), **save_kwargs)
+
+        if async_save:
+            for file, image in zip(files, arrays):
+                self.Writer.submit(path=os.path.join(full_output_folder, file), image=image, save_kwargs=save_kwargs, max_size=target.max_size, filename=filename)
+            # the frontend loads the previews once, files that are not written yet would show as broken images:
+            files = [file for file in files if os.path.exists(os.path.join(full_output_folder, file))]
+        elif self.ENCODE_WORKERS < 2 or len(files) < 2:
+            for file, image in zip(files, arrays):
+                save(file=file, image=image)
         else:
-            self.output_dir = folder_paths.get_temp_directory()
-            self.type = "temp"
-            self.prefix_append = "_temp_" + ''.join(random.choice("abcdefghijklmnopqrstupvxyz") for x in range(5))
-            self.compress_level = 1
+            with ThreadPoolExecutor(max_workers=min(self.ENCODE_WORKERS, len(files))) as executor: # the encoders release the GIL
+                list(executor.map(save, files, arrays))
 
-        # Save the images using the parent's class method
-        return(super().save_images(images=images, filename_prefix=filename_prefix, prompt=prompt, extra_pnginfo=extra_pnginfo))
+        return { "ui": { "images": [{"filename": file, "subfolder": subfolder, "type": target.type} for file in files] } }
@@ -0,0 +1,183 @@
+"""
+@author: AlexL
+@title: ComfyUI-Hangover-Sympy_Worker
+@nickname: Hangover-Sympy_Worker
+@description: Evaluates sympy expressions for the Sympy Math Interpreter, either in the ComfyUI process or in worker processes
+that can be stopped after a timeout. Run as a script, this file is such a worker: it reads one json request per line from stdin
+and writes one json response per line to stdout.
+"""
+import builtins
+import functools
+import json
+import math
+import queue
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from types import CodeType, BuiltinFunctionType
+from typing import Any
+
+
+@functools.lru_cache(maxsize=1)
+def sympy_globals() -> dict[str, Any]:
+    """The global namespace parse_expr() evaluates expressions in, built once instead of on every call"""
+    from sympy import Max, Min # sympy is imported on first use, plain arithmetic never needs it
+    global_dict: dict[str, Any] = {}
+    exec("from sympy import *", global_dict)
+    global_dict.update({name: obj for name, obj in vars(builtins).items() if isinstance(obj, BuiltinFunctionType)})
+    global_dict["max"] = Max
+    global_dict["min"] = Min
+    return global_dict
+
+
+@functools.lru_cache(maxsize=256)
+def compile_expression(expression: str, variables: tuple[str, ...]) -> CodeType:
+    """Tokenize and transform the expression like parse_expr() does, and compile the result.
+    The transformed code only depends on which variables are defined, not on their values."""
+    from sympy.parsing.sympy_parser import stringify_expr, standard_transformations
+    code = stringify_expr(expression, dict.fromkeys(variables, 0), sympy_globals(), standard_transformations)
+    return compile(code, "<string>", "eval")
+
+
+def evaluate_symbolic(expression: str, variables: dict[str, Any]) -> tuple[int, float, str]:
+    """Evaluate the expression with sympy, return the int, float and str results of the Sympy Math Interpreter"""
+    from sympy.parsing.sympy_parser import eval_expr
+    # same result as parse_expr(s=expression, local_dict=variables), but the expression is parsed only once:
+    expr_A = eval_expr(code=compile_expression(expression=expression, variables=tuple(sorted(variables))), local_dict=dict(variables), global_dict=sympy_globals())
+    try:
+        result_A = float(expr_A)
+    except TypeError:
+        result_A = 0.0
+
+    return (
+        math.floor(result_A),
+        result_A,
+        str(expr_A),
+    )
+
+
+class SympyWorker:
+    """A worker process running this file as a script"""
+
+    STARTUP_TIMEOUT: float = 60.0 # seconds to start python and import sympy, not part of the evaluation timeout
+
+    def __init__(self) -> None:
+        self.process = subprocess.Popen(args=[sys.executable, "-u", str(Path(__file__).resolve())],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8",
+                                        creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        self.responses: queue.Queue[str] = queue.Queue()
+        # pipes cannot be read with a timeout on all platforms, a thread reads them and the queue has the timeout:
+        threading.Thread(target=self._read_responses, name="Sympy worker reader", daemon=True).start()
+        # the worker imports sympy before it reads any request and tells when it is ready:
+        try:
+            ready = self.responses.get(timeout=self.STARTUP_TIMEOUT)
+        except queue.Empty:
+            ready = ""
+        if not ready:
+            self.close()
+            raise RuntimeError(f"Sympy Math Interpreter: the worker process did not start within {self.STARTUP_TIMEOUT} s")
+
+    def _read_responses(self) -> None:
+        assert self.process.stdout is not None
+        for line in self.process.stdout:
+            self.responses.put(line)
+        self.responses.put("") # the worker has exited
+
+    def request(self, expression: str, variables: dict[str, Any], timeout: float) -> dict[str, Any]:
+        """Send the expression to the worker process and return its response, raises TimeoutError if it takes longer than timeout seconds"""
+        assert self.process.stdin is not None
+        self.process.stdin.write(json.dumps({"expression": expression, "variables": variables}) + "\n")
+        self.process.stdin.flush()
+        try:
+            line = self.responses.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Sympy Math Interpreter: evaluating '{expression}' took longer than {timeout} s and was stopped") from None
+        if not line:
+            raise RuntimeError(f"Sympy Math Interpreter: the worker process exited with code {self.process.wait()} while evaluating '{expression}'")
+        return json.loads(line)
+
+    def close(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+class SympyWorkerPool:
+    """A small pool of persistent worker processes. A worker that times out is killed and replaced on demand,
+    so a pathological expression never blocks the ComfyUI executor for longer than the timeout."""
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max_workers
+        self._idle: list[SympyWorker] = []
+        self._num_workers = 0
+        self._condition = threading.Condition()
+
+    def _acquire(self) -> SympyWorker:
+        with self._condition:
+            while not self._idle and self._num_workers >= self.max_workers:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._num_workers += 1
+        try:
+            return SympyWorker()
+        except BaseException:
+            self._release(worker=None)
+            raise
+
+    def _release(self, worker: SympyWorker | None) -> None:
+        with self._condition:
+            if worker is None:
+                self._num_workers -= 1
+            else:
+                self._idle.append(worker)
+            self._condition.notify()
+
+    def evaluate(self, expression: str, variables: dict[str, Any], timeout: float) -> tuple[int, float, str]:
+        """Evaluate the expression in a worker process, raises the same exception types as evaluate_symbolic() and TimeoutError"""
+        worker: SympyWorker | None = self._acquire()
+        assert worker is not None
+        try:
+            response = worker.request(expression=expression, variables=variables, timeout=timeout)
+        except (TimeoutError, RuntimeError, OSError):
+            worker.close() # the worker is busy or gone, stop it cleanly and start a new one next time
+            worker = None
+            raise
+        finally:
+            self._release(worker=worker)
+
+        if "error" in response:
+            exception = getattr(builtins, response["error"], None)
+            if isinstance(exception, type) and issubclass(exception, Exception):
+                raise exception(response["message"])
+            raise RuntimeError(f"{response['error']}: {response['message']}")
+        result_int, result_float, result_str = response["result"]
+        return result_int, result_float, result_str
+
+    def close(self) -> None:
+        with self._condition:
+            for worker in self._idle:
+                worker.close()
+            self._num_workers -= len(self._idle)
+            self._idle.clear()
+
+
+def main() -> None:
+    responses = sys.stdout
+    sys.stdout = sys.stderr # anything printed by sympy must not end up in the responses
+    sympy_globals() # import sympy before the first request, so its timeout only covers the evaluation
+    import sympy.parsing.sympy_parser
+    responses.write(json.dumps({"ready": True}) + "\n")
+    responses.flush()
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            response: dict[str, Any] = {"result": evaluate_symbolic(expression=request["expression"], variables=request["variables"])}
+        except Exception as e:
+            response = {"error": type(e).__name__, "message": str(e)}
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+if __name__ == "__main__":
+    main()
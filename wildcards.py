@@ -0,0 +1,555 @@
+"""
+@author: AlexL
+@title: ComfyUI-Hangover-Wildcards
+@nickname: Hangover-Wildcards
+@description: The wildcard file index and prompt expansion used by the Text Encode Wildcards nodes. Has no ComfyUI dependencies.
+"""
+import re
+from pathlib import Path
+import random
+import sys
+import json
+import struct
+import functools
+import os
+import time
+import threading
+from hashlib import sha256
+from array import array
+from bisect import insort
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+
+def print_yellow(text: str) -> None:
+    print(f"\033[93m{text}\033[0m")
+
+
+LINE_INDEX_HEADER = "<qqqq" # mtime_ns, size, number of lines, weighted
+WEIGHT_PATTERN = re.compile(pattern=r'^(\d+(?:\.\d*)?|\.\d+)\s*::\s*(.*)$') # 'weight::entry'
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(prompt: str) -> tuple[str, ...]:
+    """Split a prompt into its segments. Even indices hold the literal text, odd indices the {placeholder} key words."""
+    return tuple(re.split(pattern=r'{(.*?)}', string=prompt))
+
+
+class AliasTable:
+    """Vose's alias method: draws an index with a probability proportional to its weight in constant time"""
+
+    def __init__(self, weights: list[float]) -> None:
+        num_weights = len(weights)
+        total = sum(weights)
+        scaled = [weight * num_weights / total for weight in weights]
+        self.probability = array('d', [1.0] * num_weights)
+        self.alias = array('q', range(num_weights))
+        small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    @classmethod
+    def from_arrays(cls, probability: array, alias: array) -> "AliasTable":
+        alias_table = cls.__new__(cls)
+        alias_table.probability, alias_table.alias = probability, alias
+        return alias_table
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + sys.getsizeof(self.probability) + sys.getsizeof(self.alias)
+
+    def draw(self, rng: random.Random) -> int:
+        i = rng.randrange(len(self.probability))
+        return i if rng.random() < self.probability[i] else self.alias[i]
+
+
+def parse_weight(line: str) -> tuple[str, float]:
+    """Split a wildcard line into its entry and its weight, 1 if the line has no 'weight::' prefix"""
+    if "::" in line and (match := WEIGHT_PATTERN.match(line)):
+        return match[2], float(match[1])
+    return line, 1.0
+
+
+def parse_weighted_lines(lines: list[str]) -> tuple[list[str], AliasTable | None]:
+    """Strip the optional 'weight::' prefix from the lines of a wildcard file.
+    Returns the entries and, if any line has a weight, an alias table for the weighted draw. Lines without a weight count as 1."""
+    if not any("::" in line for line in lines):
+        return lines, None
+
+    entries: list[str] = []
+    weights: list[float] = []
+    for entry, weight in map(parse_weight, lines):
+        if entry and weight > 0:
+            entries.append(entry)
+            weights.append(weight)
+    if not entries or len(set(weights)) == 1:
+        return entries, None
+    return entries, AliasTable(weights=weights)
+
+
+def index_line_offsets(file_path: Path) -> tuple[array, AliasTable | None]:
+    """Get the byte offsets of the non empty, non comment lines of a wildcard file,
+    and an alias table if any line has a weight. Only one line is held in memory at a time."""
+    offsets = array('q')
+    weights = array('d')
+    offset = 0
+    with open(file=file_path, mode="rb") as file:
+        for raw_line in file:
+            line = raw_line.decode(encoding="utf-8").strip()
+            if line and not line.startswith('#'):
+                entry, weight = parse_weight(line=line)
+                if entry and weight > 0:
+                    offsets.append(offset)
+                    weights.append(weight)
+            offset += len(raw_line)
+    if not offsets or min(weights) == max(weights):
+        return offsets, None
+    return offsets, AliasTable(weights=list(weights))
+
+
+class CachedLines(NamedTuple):
+    """The filtered lines of a wildcard file together with the file state they were read from"""
+    mtime_ns: int
+    size: int
+    lines: list[str] # empty for large files, which are accessed through their line offsets
+    offsets: array | None # byte offsets of the lines of large files
+    alias_table: AliasTable | None # only for files with weighted lines
+    num_bytes: int
+    checked: float # time.monotonic() of the last mtime and size check
+
+    @property
+    def num_lines(self) -> int:
+        return len(self.lines) if self.offsets is None else len(self.offsets)
+
+
+class WildcardFileDict(dict[str, list[Path]]):
+    """A dicionary that contains all wildcard files in the current ComfyUI installation"""
+
+    MAX_CACHE_BYTES: int = 256 * 1024 * 1024 # upper limit for the memory used by cached wildcard file lines
+    LARGE_FILE_BYTES: int = 16 * 1024 * 1024 # files above this size are not held in memory, only the offsets of their lines
+    REFRESH_INTERVAL: float = 2.0 # minimum time in seconds between two polls of the wildcard folders
+    CACHE_FOLDER: Path = Path(__file__).parent / ".cache" # persistent folder index and line offsets of large files
+    INDEX_VERSION: int = 1
+    VERBOSE: bool = True # print every wildcard file an entry is taken from
+    EXCLUDED_FOLDERS: set[str] = {".git"}
+
+    def __init__(self, root_folders: list[str] | list[Path], extensions: list[str]) -> None:
+        super().__init__()
+        self.extensions = [ext.lower() for ext in extensions]
+        self._line_cache: OrderedDict[Path, CachedLines] = OrderedDict() # least recently used entries first
+        self._cache_size: int = 0
+        self.root_folders = [Path(path).absolute().resolve() for path in root_folders]
+        self._folder_files: dict[Path, list[Path]] = {folder: [] for folder in self.root_folders} # files directly in a folder
+        self._folder_tree: dict[Path, list[Path]] = {folder: [] for folder in self.root_folders} # files in a folder and all its subfolders
+        self._subfolders: dict[Path, list[Path]] = {} # direct subfolders of every scanned folder
+        self._root_parts: list[tuple[str, ...]] = [folder.parts for folder in self.root_folders]
+        self._scan_orders: dict[Path, tuple] = {} # sort keys of the indexed files and folders, see _scan_order()
+        self._folder_mtimes: dict[Path, int] = {} # mtime of every scanned folder, changes if entries are added, removed or renamed
+        self._lock = threading.RLock() # guards the key words and the folder index against a concurrent refresh()
+        self._cache_lock = threading.RLock()
+        self._last_refresh: float = time.monotonic()
+        self.num_files = 0
+        self.version = 0 # incremented on every change of the wildcard files
+
+        if self._load_index():
+            self.refresh(force=True) # only folders whose mtime differs from the cached one get scanned
+        else:
+            for root_folder in self.root_folders:
+                self._scan_folder(folder_path=root_folder)
+            self._save_index()
+        self._sort_keys()
+
+        if not self.num_files:
+            self.print_warning()
+
+    def __repr__(self) -> str:
+        size = sys.getsizeof(self)
+        keys = len(self)
+        return f"Wildcards: {len(self)}, wildcard files: {self.num_files}, size: {sys.getsizeof(self)} bytes."
+
+    def __str__(self) -> str:
+        result: str = ""
+        for key, value in self.items():
+            result += f"{key}:\n"
+            for value in self[key]:
+                result += f"  -{value}\n"
+        return result
+
+    def print_warning(self) -> None: 
+        print_yellow(f"Warning: Text Encode Wildcards: No fildcards files could be found in '{self.root_folders}'")
+
+    def _scan_order(self, path: Path, is_file: bool = True) -> tuple:
+        """The position of a file or folder in a full scan: the root folders in order, and in every folder
+        its files by name first, then its subfolders by name"""
+        if (order := self._scan_orders.get(path)) is None:
+            parts = path.parts
+            root = next((i for i, folder in enumerate(self._root_parts) if parts[:len(folder)] == folder), 0)
+            parts = parts[len(self._root_parts[root]):]
+            if is_file:
+                order = (root, *((1, part) for part in parts[:-1]), (0, parts[-1]))
+            else:
+                order = (root, *((1, part) for part in parts))
+            self._scan_orders[path] = order
+        return order
+
+    def _insert(self, items: list[Path], path: Path, is_file: bool = True) -> None:
+        """Insert into a list in scan order, so that the lists are the same after a refresh as after a full scan,
+        and a seed draws the same entries. A full scan only appends."""
+        order = self._scan_order(path=path, is_file=is_file)
+        if not items or self._scan_order(path=items[-1], is_file=is_file) < order:
+            items.append(path)
+        else:
+            insort(items, path, key=lambda item: self._scan_order(path=item, is_file=is_file))
+
+    def _index_file(self, file_path: Path) -> None:
+        """Add a file to the file list of its folder and to the recursive file lists of its parent folders up to the root folder"""
+        parents = file_path.parents
+        depth = next((i for i, parent in enumerate(parents) if parent in self.root_folders), 0)
+        self._insert(items=self._folder_files.setdefault(file_path.parent, []), path=file_path)
+        for parent in parents[:depth + 1]:
+            self._insert(items=self._folder_tree.setdefault(parent, []), path=file_path)
+
+    def _read_folder(self, folder_path: Path) -> tuple[int, list[Path], list[Path]] | None:
+        """Get the mtime, the wildcard files and the subfolders of a folder, or None if it cannot be read"""
+        try:
+            mtime_ns = folder_path.stat().st_mtime_ns # read before the entries, so that concurrent changes are found by the next refresh
+            entries = sorted(os.scandir(folder_path), key=lambda entry: entry.name)
+        except OSError:
+            return
+
+        files: list[Path] = []
+        subfolders: list[Path] = []
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if entry.name not in self.EXCLUDED_FOLDERS and not (entry.is_symlink() and Path(entry.path).resolve() in folder_path.resolve().parents):
+                        subfolders.append(folder_path / entry.name)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in self.extensions:
+                    files.append(folder_path / entry.name)
+            except OSError:
+                pass
+        return mtime_ns, files, subfolders
+
+    def _scan_folder(self, folder_path: Path) -> None:
+        """Add all wildcard files of a folder and its subfolders"""
+        if (content := self._read_folder(folder_path=folder_path)) is None:
+            return
+        self._folder_mtimes[folder_path], files, self._subfolders[folder_path] = content
+        for file_path in files:
+            self._add_file(file_path=file_path)
+        for subfolder_path in self._subfolders[folder_path]:
+            self._scan_folder(folder_path=subfolder_path)
+
+    def _update_folder(self, folder_path: Path) -> None:
+        """Apply the changes of a single folder whose mtime has changed"""
+        if (content := self._read_folder(folder_path=folder_path)) is None:
+            self._remove_folder(folder_path=folder_path)
+            return
+        self._folder_mtimes[folder_path], files, subfolders = content
+
+        old_files = set(self._folder_files.get(folder_path, []))
+        self._remove_files(file_paths=old_files.difference(files))
+        for file_path in files:
+            if file_path not in old_files:
+                self._add_file(file_path=file_path)
+
+        old_subfolders = set(self._subfolders.get(folder_path, []))
+        self._subfolders[folder_path] = subfolders
+        for subfolder_path in old_subfolders.difference(subfolders):
+            self._remove_folder(folder_path=subfolder_path)
+        for subfolder_path in subfolders:
+            if subfolder_path not in old_subfolders:
+                self._scan_folder(folder_path=subfolder_path)
+
+    def _remove_folder(self, folder_path: Path) -> None:
+        """Remove a folder, its subfolders and all their files"""
+        folders: list[Path] = [folder_path]
+        for folder in folders: # the list grows while iterating
+            folders.extend(self._subfolders.get(folder, []))
+        self._remove_files(file_paths={file_path for folder in folders for file_path in self._folder_files.get(folder, [])})
+        for folder in folders:
+            self._folder_mtimes.pop(folder, None)
+            self._subfolders.pop(folder, None)
+            self._scan_orders.pop(folder, None)
+            if folder not in self.root_folders:
+                self._folder_files.pop(folder, None)
+                self._folder_tree.pop(folder, None)
+
+    def _add_file(self, file_path: Path) -> None:
+        """Add a file to the list of its key word, and its folder to the list of the folder key word"""
+        folder_path = file_path.parent
+        if folder_path not in self.root_folders and not self._folder_files.get(folder_path): # the first file of this folder
+            self._insert(items=self.setdefault(folder_path.stem.lower() + '*', []), path=folder_path, is_file=False)
+        self._insert(items=self.setdefault(file_path.stem.lower(), []), path=file_path)
+        self._index_file(file_path=file_path)
+        self.num_files += 1
+
+    def _remove_items(self, key_word: str, items: set[Path]) -> None:
+        if (remaining := [item for item in self._get_items(key_word=key_word) if item not in items]):
+            self[key_word] = remaining
+        else:
+            self.pop(key_word, None)
+
+    def _remove_files(self, file_paths: set[Path]) -> None:
+        """Remove files from the key word lists and from the folder index"""
+        if not file_paths:
+            return
+
+        for file_path in file_paths:
+            self._evict(file_path=file_path)
+            self._scan_orders.pop(file_path, None)
+            self._line_index_file(file_path=file_path).unlink(missing_ok=True)
+        for key_word in {file_path.stem.lower() for file_path in file_paths}:
+            self._remove_items(key_word=key_word, items=file_paths)
+        for folder_path in {parent for file_path in file_paths for parent in file_path.parents if parent in self._folder_tree}:
+            self._folder_tree[folder_path] = [file_path for file_path in self._folder_tree[folder_path] if file_path not in file_paths]
+        for folder_path in {file_path.parent for file_path in file_paths}:
+            self._folder_files[folder_path] = [file_path for file_path in self._folder_files.get(folder_path, []) if file_path not in file_paths]
+            if not self._folder_files[folder_path] and folder_path not in self.root_folders:
+                self._remove_items(key_word=folder_path.stem.lower() + '*', items={folder_path})
+        self.num_files -= len(file_paths)
+
+    def _sort_keys(self) -> None:
+        """Sort the key words alphabetically, with the root folder(s) keyword '{*}' first"""
+        self.pop('*', None)
+        entries = sorted(self.items(), key=lambda item: item[0])
+        self.clear()
+        if self.num_files:
+            self['*'] = self.root_folders # add the root path(s) as keyword '{*}'
+        self.update(entries)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Poll the mtimes of the wildcard folders and patch the key words of the folders that have changed.
+        Polls at most once every REFRESH_INTERVAL seconds unless forced. Returns True if anything has changed."""
+        if not force and time.monotonic() - self._last_refresh < self.REFRESH_INTERVAL:
+            return False
+
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            changed = False
+            for folder_path in list(self._folder_mtimes.keys() | set(self.root_folders)):
+                if folder_path not in self._folder_mtimes and folder_path not in self.root_folders:
+                    continue # already removed together with its parent folder
+                try:
+                    mtime_ns = folder_path.stat().st_mtime_ns
+                except OSError:
+                    mtime_ns = None
+                if mtime_ns == self._folder_mtimes.get(folder_path):
+                    continue
+
+                changed = True
+                if mtime_ns is None:
+                    self._remove_folder(folder_path=folder_path)
+                else:
+                    self._update_folder(folder_path=folder_path)
+
+            if changed:
+                self._sort_keys()
+                self.version += 1
+                self._save_index()
+                print(f"Text Encode Wildcards: wildcard files have changed. {repr(self)}")
+            return changed
+
+    def _load_index(self) -> bool:
+        """Restore the folders and files from the index cache, if it was written for the same root folders and extensions.
+        The restored folders still need to be validated with refresh()."""
+        try:
+            with open(file=self.CACHE_FOLDER / "wildcards_index.json", encoding="utf-8") as file:
+                index = json.load(fp=file)
+            if (index["version"] != self.INDEX_VERSION or index["extensions"] != self.extensions
+                    or index["root_folders"] != [str(folder) for folder in self.root_folders]):
+                return False
+            folders = [(Path(folder), int(mtime_ns), list(files), list(subfolders)) for folder, (mtime_ns, files, subfolders) in index["folders"].items()]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        for folder_path, mtime_ns, files, subfolders in folders:
+            self._folder_mtimes[folder_path] = mtime_ns
+            self._subfolders[folder_path] = [folder_path / name for name in subfolders]
+            for name in files:
+                self._add_file(file_path=folder_path / name)
+        return True
+
+    def _save_index(self) -> None:
+        index = {
+            "version": self.INDEX_VERSION,
+            "root_folders": [str(folder) for folder in self.root_folders],
+            "extensions": self.extensions,
+            "folders": {str(folder_path): [mtime_ns,
+                                           [file_path.name for file_path in self._folder_files.get(folder_path, [])],
+                                           [subfolder_path.name for subfolder_path in self._subfolders.get(folder_path, [])]]
+                        for folder_path, mtime_ns in self._folder_mtimes.items()},
+        }
+        index_file = self.CACHE_FOLDER / "wildcards_index.json"
+        try:
+            self.CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+            with open(file=index_file.with_suffix(".tmp"), mode="w", encoding="utf-8") as file:
+                json.dump(obj=index, fp=file, separators=(",", ":"))
+            os.replace(src=index_file.with_suffix(".tmp"), dst=index_file)
+        except OSError as e:
+            print_yellow(text=f"Warning: Text Encode Wildcards: Cannot write the wildcard index cache '{index_file}': {e}")
+
+    def _line_index_file(self, file_path: Path) -> Path:
+        return self.CACHE_FOLDER / "offsets" / f"{sha256(str(file_path).encode()).hexdigest()[:32]}.idx"
+
+    def _load_line_index(self, file_path: Path, stat: os.stat_result) -> tuple[array, AliasTable | None] | None:
+        """Read the cached line offsets of a large file, if they were written for its current mtime and size"""
+        try:
+            with open(file=self._line_index_file(file_path=file_path), mode="rb") as file:
+                mtime_ns, size, num_lines, weighted = struct.unpack(LINE_INDEX_HEADER, file.read(struct.calcsize(LINE_INDEX_HEADER)))
+                if mtime_ns != stat.st_mtime_ns or size != stat.st_size:
+                    return
+                offsets = array('q')
+                offsets.fromfile(file, num_lines)
+                if not weighted:
+                    return offsets, None
+                probability, alias = array('d'), array('q')
+                probability.fromfile(file, num_lines)
+                alias.fromfile(file, num_lines)
+                return offsets, AliasTable.from_arrays(probability=probability, alias=alias)
+        except (OSError, EOFError, struct.error):
+            return
+
+    def _save_line_index(self, file_path: Path, stat: os.stat_result, offsets: array, alias_table: AliasTable | None) -> None:
+        index_file = self._line_index_file(file_path=file_path)
+        try:
+            index_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(file=index_file.with_suffix(".tmp"), mode="wb") as file:
+                file.write(struct.pack(LINE_INDEX_HEADER, stat.st_mtime_ns, stat.st_size, len(offsets), alias_table is not None))
+                offsets.tofile(file)
+                if alias_table is not None:
+                    alias_table.probability.tofile(file)
+                    alias_table.alias.tofile(file)
+            os.replace(src=index_file.with_suffix(".tmp"), dst=index_file)
+        except OSError as e:
+            print_yellow(text=f"Warning: Text Encode Wildcards: Cannot write the line index cache '{index_file}': {e}")
+
+    def _get_items(self, key_word: str) -> list[Path]:
+        if key_word in self.keys():
+            return self[key_word]
+        else:
+            return []
+
+    def _get_random_file(self, key_word: str, recursive: bool, rng: random.Random) -> Path | None:
+        items = self._get_items(key_word=key_word)
+        if not items:
+            print_yellow(f"No entries found for key word '{key_word}', skipping.")
+            return
+
+        result: Path = rng.choice(items)
+        if result in self._folder_files: # the key word is a folder, pick a file from the precomputed folder index
+            if (file_list := (self._folder_tree if recursive else self._folder_files)[result]):
+                return rng.choice(file_list)
+            else:
+                print_yellow(text=f"No wildcars files found for '{key_word}' in folder '{result}', skipping.")
+                return
+        return result
+
+    def _evict(self, file_path: Path) -> None:
+        with self._cache_lock:
+            if (cached := self._line_cache.pop(file_path, None)) is not None:
+                self._cache_size -= cached.num_bytes
+
+    def _get_lines(self, file_path: Path) -> CachedLines:
+        """Get the non empty, non comment lines of a wildcard file, with the alias table if the lines are weighted.
+        The lines are cached and only read again from disk if the file's mtime or size have changed.
+        The file gets checked at most once every REFRESH_INTERVAL seconds, so a whole batch shares one check."""
+        now = time.monotonic()
+        with self._cache_lock:
+            if (cached := self._line_cache.get(file_path)) is not None and now - cached.checked < self.REFRESH_INTERVAL:
+                self._line_cache.move_to_end(file_path)
+                return cached
+
+        stat = file_path.stat()
+        with self._cache_lock:
+            if (cached := self._line_cache.get(file_path)) is not None:
+                if cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+                    self._line_cache[file_path] = cached._replace(checked=now)
+                    self._line_cache.move_to_end(file_path)
+                    return cached
+                self._evict(file_path)
+
+        if stat.st_size > self.LARGE_FILE_BYTES:
+            lines: list[str] = []
+            if (line_index := self._load_line_index(file_path=file_path, stat=stat)) is None:
+                line_index = index_line_offsets(file_path=file_path)
+                self._save_line_index(file_path=file_path, stat=stat, offsets=line_index[0], alias_table=line_index[1])
+            offsets, alias_table = line_index
+            num_bytes = sys.getsizeof(offsets) + sys.getsizeof(alias_table)
+        else:
+            with open(file=file_path, encoding="utf-8") as file:
+                lines, alias_table = parse_weighted_lines(lines=[line for line in (line.strip() for line in file) if line and not line.startswith('#')])
+            offsets = None
+            num_bytes = sys.getsizeof(lines) + sum(sys.getsizeof(line) for line in lines) + sys.getsizeof(alias_table)
+
+        cached = CachedLines(mtime_ns=stat.st_mtime_ns, size=stat.st_size, lines=lines, offsets=offsets, alias_table=alias_table, num_bytes=num_bytes, checked=now)
+        if num_bytes <= self.MAX_CACHE_BYTES:
+            with self._cache_lock:
+                self._evict(file_path=file_path) # another thread might have read the file in the meantime
+                self._line_cache[file_path] = cached
+                self._cache_size += num_bytes
+                while self._cache_size > self.MAX_CACHE_BYTES: # drop the least recently used files
+                    self._evict(file_path=next(iter(self._line_cache)))
+        return cached
+
+    def _choose_line(self, file_path: Path, cached: CachedLines, rng: random.Random) -> str:
+        """Draw a line of a loaded wildcard file, large files are read at the offset of the drawn line only"""
+        if cached.offsets is None:
+            return rng.choice(seq=cached.lines) if cached.alias_table is None else cached.lines[cached.alias_table.draw(rng=rng)]
+
+        index = rng.randrange(cached.num_lines) if cached.alias_table is None else cached.alias_table.draw(rng=rng)
+        with open(file=file_path, mode="rb") as file:
+            file.seek(cached.offsets[index])
+            line = file.readline().decode(encoding="utf-8").strip()
+        return parse_weight(line=line)[0]
+
+    def get_random_entry(self, key_word: str, recursive: bool, seed: int = -1) -> str | None:
+        """Get a random line from a random file of the key word.
+        All random choices are made with a generator of its own, seeded with seed if seed >= 0,
+        so that concurrent calls neither affect each other nor the global random module."""
+        rng = random.Random(seed) if seed >= 0 else random.Random()
+        with self._lock:
+            if not self:
+                self.print_warning()
+                return
+            item = self._get_random_file(key_word=key_word, recursive=recursive, rng=rng)
+
+        if item is not None:
+            if self.VERBOSE:
+                print(f"Getting wildcard entry for '{key_word}' from '{item}'")
+            if (cached := self._get_lines(file_path=item)).num_lines:
+                return self._choose_line(file_path=item, cached=cached, rng=rng)
+            else:
+                print_yellow(text=f"Warning: '{item}' seem to be empty, skipping.")
+
+    @property
+    def get_keys(self) -> list[str]:
+        return list(self.keys())
+
+    def expand_template(self, segments: tuple[str, ...], recursive: bool, seed: int = -1, max_depth: int = 8, depth: int = 0) -> str:
+        """Replace the placeholders of a compiled template in a single pass, nested placeholders get expanded up to max_depth"""
+        parts = list(segments)
+        for s, i in enumerate(iterable=range(1, len(parts), 2)):
+            text = self.get_random_entry(key_word=parts[i].lower(), recursive=recursive, seed=seed+s if seed >= 0 else -1)
+            if not text:
+                parts[i] = f"{{{parts[i]}}}" # keep the unresolved placeholder
+                continue
+            if depth < max_depth and len(nested := compile_template(prompt=text)) > 1:
+                text = self.expand_template(segments=nested, recursive=recursive, seed=hash((seed, s)) & sys.maxsize if seed >= 0 else -1, max_depth=max_depth, depth=depth + 1)
+            parts[i] = text
+        return "".join(parts)
+
+    def expand_batch(self, prompt: str, recursive: bool, seeds: range, max_depth: int = 8, max_workers: int = 1) -> list[str]:
+        """Expand the prompt once for every seed, equal to calling expand_template() with each seed.
+        The prompt is compiled only once and the wildcard files are loaded only once for the whole batch.
+        The prompts are expanded in parallel by up to max_workers threads."""
+        expand = functools.partial(self.expand_template, compile_template(prompt=prompt), recursive, max_depth=max_depth)
+        if max_workers < 2 or len(seeds) < 2:
+            return list(map(expand, seeds))
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(seeds))) as executor:
+            return list(executor.map(expand, seeds))